@@ -8,17 +8,28 @@
 #
 
 import re
+import sys
+from functools import lru_cache
+from operator import methodcaller
+from pyexpat import ExpatError
+from pyexpat import ParserCreate
 from urllib.parse import urljoin
 from xml.etree import ElementTree as ET
 
-from bs4 import BeautifulSoup
+_TAG_RE = re.compile(r'(<\/?)([a-zA-Z_][\w.-]*)>')
 
 
 def relative_to_absolute(root, base_url):
+    # Documents tend to repeat the same links: join each distinct one once.
+    absolute_urls = {}
+    get_absolute_url = absolute_urls.get
     for element in root.iter():
         url = element.get('href')
         if url:
-            absolute_url = urljoin(base_url, url)
+            absolute_url = get_absolute_url(url)
+            if absolute_url is None:
+                absolute_url = urljoin(base_url, url)
+                absolute_urls[url] = absolute_url
             element.set('href', absolute_url)
 
 
@@ -29,12 +40,12 @@ class XMLParser(ET.XMLParser):
 
 
 def remove_attribute(element: ET.Element, attributes_to_delete):
-    attributes = element.attrib
-    for attribute in list(attributes):
-        for del_attr in attributes_to_delete:
-            if del_attr.match(attribute):
-                attributes.pop(attribute)
-                break
+    matches = attributes_to_delete.fullmatch
+    # keys() returns a fresh list and, unlike attrib, does not create an
+    # attribute dict on elements that have none.
+    for attribute in element.keys():
+        if matches(attribute):
+            del element.attrib[attribute]
 
 
 Comment = ET.Comment
@@ -52,6 +63,19 @@ def dump(elem, pretty_print=True, with_tail=True):
     ET.dump(elem=elem)
 
 
+# The global {uri: prefix} map of ET.register_namespace. It is private to
+# ElementTree, so everything using it must still work when it is missing.
+_namespace_map = getattr(ET, "_namespace_map", None)
+
+
+def _register_namespace(prefix, uri):
+    # ET.register_namespace rescans and rewrites its map on every call, so skip
+    # pairs that are already registered. The map itself is checked rather than a
+    # copy, which would go stale when anything else registers a namespace.
+    if _namespace_map is None or _namespace_map.get(uri) != prefix:
+        ET.register_namespace(prefix, uri)
+
+
 def Element(_tag, attrib=None, nsmap=None, **_extra):
     """
     Element(_tag, attrib=None, nsmap=None, **_extra)
@@ -64,15 +88,19 @@ def Element(_tag, attrib=None, nsmap=None, **_extra):
         create an Element within a specific document or parser context.
     """
     if nsmap:
-        if type(nsmap) == dict:
-            for key, value in nsmap.items():
-                ET.register_namespace(key, value)
-        else:
-            raise TypeError("nsmap should be type dictionary")
+        _register_nsmap(nsmap)
     element = ET.Element(_tag, attrib or {}, **_extra)
     return element
 
 
+def _register_nsmap(nsmap):
+    if isinstance(nsmap, dict):
+        for key, value in nsmap.items():
+            _register_namespace(key, value)
+    else:
+        raise TypeError("nsmap should be type dictionary")
+
+
 def ElementTree(element=None, file=None, parser=None):
     """
     ElementTree(element=None, file=None, parser=None)
@@ -88,22 +116,28 @@ def ElementTree(element=None, file=None, parser=None):
 
 
 def pre_process(html_content):
-    tags = set(re.findall(r'<\/?([a-zA-Z_][\w.-]*)>', html_content))
-    mapping = {tag: f"TAG{index}" for index, tag in enumerate(tags)}
+    mapping = {}
 
     def replacement(m):
-        return f"{m.group(1)}{mapping[m.group(2)]}{m.group(3)}"
-
-    processed = re.sub(r'(<\/?)([a-zA-Z_][\w.-]*)(>)', replacement, html_content)
+        tag = m.group(2)
+        code = mapping.get(tag)
+        if code is None:
+            code = f"tag{len(mapping)}"
+            mapping[tag] = code
+        return m.group(1) + code + ">"
+
+    processed = _TAG_RE.sub(replacement, html_content)
     return processed, mapping
 
 
 def post_process(soup, mapping):
     reverse_mapping = {v: k for k, v in mapping.items()}
+    # html.parser lowercases tag names, so the codes are generated lowercase
+    # and can be looked up as-is.
     for tag in soup.find_all(True):
-        tag_name_upper = tag.name.upper()
-        if tag_name_upper in reverse_mapping:
-            tag.name = reverse_mapping[tag_name_upper]
+        original_name = reverse_mapping.get(tag.name)
+        if original_name is not None:
+            tag.name = original_name
 
 
 def fromstring(text, parser=None, base_url=None):
@@ -119,29 +153,125 @@ def fromstring(text, parser=None, base_url=None):
         The ``base_url`` keyword argument allows to set the original base URL of
         the document to support relative Paths when looking up external entities
         (DTD, XInclude, ...).
+
+        Well-formed input is parsed directly by the expat-backed parser. Only
+        input that this parser rejects goes through the slower BeautifulSoup
+        sanitizing round-trip.
     """
-    if type(text) == bytes:
-        text = text.decode()
-    processed_html, mapping = pre_process(text)
-    soup = BeautifulSoup(processed_html, "html.parser")
-    post_process(soup, mapping)
-    text = str(soup)
-    root = ET.fromstring(text=text, parser=parser)
+    root = None
+    if parser is None:
+        try:
+            root = _parse_well_formed(text)
+        except (ET.ParseError, ExpatError):
+            pass
+    if root is None:
+        root = _sanitize_and_parse(text, parser)
     if base_url:
         relative_to_absolute(root, base_url)
     return root
 
 
+# Below this size, setting up an ET.XMLParser costs more than the parse itself
+# and driving pyexpat directly is faster. Above it, the C XMLParser calling its
+# TreeBuilder without going through Python callables wins.
+_SMALL_DOCUMENT_SIZE = 4096
+
+
+def _parse_well_formed(text):
+    if _is_small_plain_document(text):
+        return _parse_with_expat(text)
+    # Unlike ET.fromstring, this lets the C parser create its own TreeBuilder
+    # instead of getting one constructed from Python.
+    xml_parser = ET.XMLParser()
+    xml_parser.feed(text)
+    return xml_parser.close()
+
+
+def _is_small_plain_document(text):
+    """
+    Return True if ``text`` is short and declares no namespace, so that the
+    names reported by pyexpat are the ones ElementTree would use.
+    """
+    if isinstance(text, str):
+        return (
+            len(text) < _SMALL_DOCUMENT_SIZE
+            and "xmlns" not in text
+            and "xml:" not in text
+        )
+    if isinstance(text, bytes):
+        # Non-ASCII bytes may be in an encoding where the checks below miss.
+        return (
+            len(text) < _SMALL_DOCUMENT_SIZE
+            and text.isascii()
+            and b"xmlns" not in text
+            and b"xml:" not in text
+        )
+    return False
+
+
+def _parse_with_expat(text):
+    builder = ET.TreeBuilder()
+    # Namespace processing is kept on so that undeclared prefixes are
+    # rejected as ET.XMLParser does.
+    parser = ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    parser.StartElementHandler = builder.start
+    parser.EndElementHandler = builder.end
+    parser.CharacterDataHandler = builder.data
+    parser.SkippedEntityHandler = _reject_skipped_entity
+    parser.Parse(text, True)
+    return builder.close()
+
+
+def _reject_skipped_entity(name, is_parameter_entity):
+    # ET.XMLParser reports references to undeclared entities as errors where
+    # expat alone skips them when the document has an external DTD.
+    if not is_parameter_entity:
+        raise ExpatError(f"undefined entity &{name};")
+
+
+def _sanitize_and_parse(text, parser=None):
+    """
+    Parse ``text`` after normalizing it through BeautifulSoup to recover
+    from malformed markup.
+    """
+    # BeautifulSoup is slow to import and only needed for malformed input.
+    from bs4 import BeautifulSoup
+
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        text = str(text, "utf-8")
+    processed_html, mapping = pre_process(text)
+    # Attribute values are kept as plain strings: splitting HTML multi-valued
+    # attributes such as "class" is wasted work that str(soup) undoes anyway.
+    soup = BeautifulSoup(processed_html, "html.parser", multi_valued_attributes=None)
+    post_process(soup, mapping)
+    text = str(soup)
+    return ET.fromstring(text=text, parser=parser)
+
+
+# ET.indent is only available from Python 3.9 on.
+_ET_indent = getattr(ET, "indent", None)
+
+_indentations = {}
+
+
+def _indentation(depth):
+    indentation = _indentations.get(depth)
+    if indentation is None:
+        indentation = _indentations[depth] = '\n' + ('  ' * depth)
+    return indentation
+
+
 def _pretty_print(current, parent=None, index=-1, depth=0):
     for i, node in enumerate(current):
         _pretty_print(node, current, i, depth + 1)
     if parent is not None:
         if index == 0:
-            parent.text = '\n' + ('  ' * depth)
+            parent.text = _indentation(depth)
         else:
-            parent[index - 1].tail = '\n' + ('  ' * depth)
+            parent[index - 1].tail = _indentation(depth)
         if index == len(parent) - 1:
-            current.tail = '\n' + ('  ' * (depth - 1))
+            current.tail = _indentation(depth - 1)
 
 
 def indent(tree, space="  ", level=0):
@@ -162,9 +292,9 @@ def indent(tree, space="  ", level=0):
         value than 0 can be used for indenting subtrees that are more deeply
         nested inside of a document.
     """
-    try:
-        ET.indent(tree=tree, space=space, level=level)
-    except AttributeError:
+    if _ET_indent is not None:
+        _ET_indent(tree, space=space, level=level)
+    else:
         _pretty_print(tree)
 
 
@@ -174,7 +304,7 @@ def iselement(element):
 
         Checks if an object appears to be a valid element object.
     """
-    return ET.iselement(element)
+    return isinstance(element, ET.Element)
 
 
 def parse(source, parser=None, base_url=None):
@@ -209,6 +339,87 @@ def parse(source, parser=None, base_url=None):
     return element_tree
 
 
+def parse_stream(source, keep=None):
+    """
+    parse_stream(source, keep=None)
+
+        Parses an XML document incrementally from ``source`` and returns the
+        root element.  This is the preferred entry point for large documents.
+
+        The ``source`` can be a file name/path or a file object, as for
+        ``parse()``.
+
+        Each element is passed to the ``keep`` callable once it is fully
+        parsed.  Elements for which ``keep`` returns a false value are
+        cleared of their text, tail, attributes and children as soon as
+        they are parsed, so that memory use does not grow with the part of
+        the document that is discarded.  The cleared elements stay in the
+        tree as empty elements.  The root element is never cleared.  With
+        no ``keep`` callable, the whole tree is kept as with ``parse()``.
+
+        Unlike ``parse()`` and ``fromstring()``, malformed input is not
+        sanitized and raises a ``ParseError``.
+    """
+    events = ET.iterparse(source, events=("end",))
+    if keep is None:
+        for _ in events:
+            pass
+    else:
+        # Clearing is deferred to the next event so that the root, which is
+        # the last element to end, is never cleared.
+        discarded = None
+        for _, element in events:
+            if discarded is not None:
+                discarded.clear()
+            discarded = None if keep(element) else element
+    return events.root
+
+
+@lru_cache(maxsize=256)
+def _compile_names(names):
+    """
+    Return a compiled regex matching any of the ``names`` tuple in full, where
+    ``*`` in a name is a wildcard and any other character matches literally.
+    A single alternation lets the regex engine test all the names at once.
+    """
+    patterns = (".*".join(map(re.escape, name.split("*"))) for name in names)
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+def _tag_matcher(tag_names):
+    """
+    Return a callable telling whether an element tag is one of ``tag_names``,
+    which are tag names with optional wildcards or the ``Comment`` factory.
+    """
+    names = [tag for tag in tag_names if isinstance(tag, str)]
+    # Plain names are looked up in a set, only wildcard names need the regex.
+    exact_names = frozenset(name for name in names if "*" not in name)
+    wildcard_names = tuple(name for name in names if "*" in name)
+    pattern = _compile_names(wildcard_names) if wildcard_names else None
+    with_comments = Comment in tag_names
+
+    def matches(tag):
+        if isinstance(tag, str):
+            return tag in exact_names or (
+                pattern is not None and pattern.fullmatch(tag) is not None
+            )
+        return with_comments and tag is Comment
+
+    return matches
+
+
+def _only_comments_absent(root, tag_names):
+    """
+    Return True if ``tag_names`` only asks for comments and there are none
+    under ``root``. The C element iterator does this check without visiting
+    every node from Python.
+    """
+    return (
+        all(tag is Comment for tag in tag_names)
+        and next(root.iter(Comment), None) is None
+    )
+
+
 def strip_attributes(tree_or_element, *attribute_names):
     """
     strip_attributes(tree_or_element, *attribute_names)
@@ -225,9 +436,7 @@ def strip_attributes(tree_or_element, *attribute_names):
                              '{http://some/ns}attrname',
                              '{http://other/ns}*')
     """
-    attributes_to_delete = []
-    for attribute in attribute_names:
-        attributes_to_delete.append(re.compile(attribute.replace("*", ".*")))
+    attributes_to_delete = _compile_names(attribute_names)
 
     if isinstance(tree_or_element, ET.Element):
         remove_attribute(element=tree_or_element, attributes_to_delete=attributes_to_delete)
@@ -269,22 +478,26 @@ def strip_elements(tree_or_element, *tag_names, with_tail=True):
         root = tree_or_element.getroot()
     else:
         root = tree_or_element
-    parent_map = {c: p for p in root.iter() for c in p}
-    for tag in tag_names:
-        if type(tag) == str:
-            elements_to_be_removed = root.findall(".//" + tag)
-            for element_to_be_removed in elements_to_be_removed:
-                if with_tail:
-                    if element_to_be_removed.tail:
-                        element_to_be_removed.tail = ""
-                parent: ET.Element = parent_map[element_to_be_removed]
-                parent.remove(element_to_be_removed)
-        elif isinstance(tag, ET.Element):
-            if tag == ET.Comment:
-                for element in root.findall(".//"):
-                    if element.tag == ET.Comment:
-                        parent = parent_map[element]
-                        parent.remove(element)
+    if _only_comments_absent(root, tag_names):
+        return
+    _strip_elements(root, _tag_matcher(tag_names), with_tail)
+
+
+def _strip_elements(root, matches, with_tail):
+    # An explicit stack of parents to visit avoids recursion limits on deep
+    # trees. Children are visited last to first so they can be deleted in
+    # place without shifting the indexes that remain to be visited.
+    parents = [root]
+    while parents:
+        parent = parents.pop()
+        for index in range(len(parent) - 1, -1, -1):
+            child = parent[index]
+            if matches(child.tag):
+                if not with_tail and child.tail:
+                    _append_text(parent, index, child.tail)
+                del parent[index]
+            elif len(child):
+                parents.append(child)
 
 
 def strip_tags(tree_or_element, *tag_names):
@@ -316,15 +529,49 @@ def strip_tags(tree_or_element, *tag_names):
         root = tree_or_element.getroot()
     else:
         root = tree_or_element
-    tags_to_remove = dict()
-    parent_map = {c: p for p in root.iter() for c in p}
-    for tag in tag_names:
-        if tag == ET.Comment:
-            for element in root.findall(".//"):
-                if element.tag == ET.Comment:
-                    parent = parent_map[element]
-                    parent.text = element.tail
-                    parent.remove(element)
+    if _only_comments_absent(root, tag_names):
+        return
+    _strip_tags(root, _tag_matcher(tag_names))
+
+
+def _strip_tags(root, matches):
+    parents = [root]
+    while parents:
+        parent = parents.pop()
+        index = len(parent)
+        while index:
+            index -= 1
+            child = parent[index]
+            if not matches(child.tag):
+                if len(child):
+                    parents.append(child)
+                continue
+            # The text of comments and processing instructions is dropped.
+            text = child.text if isinstance(child.tag, str) else None
+            children = list(child)
+            if children:
+                if child.tail:
+                    last = children[-1]
+                    last.tail = (last.tail or "") + child.tail
+            elif child.tail:
+                text = (text or "") + child.tail
+            if text:
+                _append_text(parent, index, text)
+            parent[index:index + 1] = children
+            # The merged children take the place of the stripped element and
+            # are visited next.
+            index += len(children)
+
+
+def _append_text(parent, index, text):
+    """
+    Append ``text`` right before the child at ``index`` of ``parent``.
+    """
+    if index:
+        previous = parent[index - 1]
+        previous.tail = (previous.tail or "") + text
+    else:
+        parent.text = (parent.text or "") + text
 
 
 def SubElement(_parent: ET.Element, _tag, attrib=None, nsmap=None, **_extra):
@@ -334,9 +581,9 @@ def SubElement(_parent: ET.Element, _tag, attrib=None, nsmap=None, **_extra):
         Subelement factory.  This function creates an element instance, and
         appends it to an existing element.
     """
-    new_element = Element(_tag=_tag, attrib=attrib, nsmap=nsmap, **_extra)
-    _parent.append(new_element)
-    return new_element
+    if nsmap:
+        _register_nsmap(nsmap)
+    return ET.SubElement(_parent, _tag, attrib or {}, **_extra)
 
 
 def tostringlist(element_or_tree, *args, **kwargs):
@@ -352,22 +599,298 @@ def tostringlist(element_or_tree, *args, **kwargs):
     return ET.tostringlist(element_or_tree, *args, **kwargs)
 
 
+# Before Python 3.9, ET.tostring sorts attributes (3.7) and escapes "\r" in
+# attribute values as "&#10;" (3.7 and 3.8), which _serialize does not mimic.
+_SERIALIZE_LIKE_ET = sys.version_info >= (3, 9)
+
+
 def tostring(element_or_tree, method=None, encoding=None, pretty_print=False):
+    if (
+        _SERIALIZE_LIKE_ET
+        and method in (None, "xml")
+        and isinstance(element_or_tree, ET.Element)
+    ):
+        codec = (encoding or "us-ascii").lower()
+        if codec in ("us-ascii", "utf-8"):
+            buffer = bytearray()
+            # The {uri: prefix} namespaces declared by this call, and the
+            # markup of the namespaced tag and attribute names using them.
+            qualified = ({}, {}, {})
+            try:
+                _serialize(
+                    buffer,
+                    element_or_tree,
+                    element_or_tree.tail,
+                    0,
+                    pretty_print,
+                    codec,
+                    _encoded_caches[codec],
+                    qualified,
+                )
+            except _Unserializable:
+                pass
+            else:
+                namespaces = qualified[0]
+                if namespaces:
+                    _declare_namespaces(buffer, element_or_tree.tag, codec, qualified)
+                return bytes(buffer)
     if pretty_print:
-        ET.indent(element_or_tree)
+        # _serialize indents without modifying the tree, namespaced or not. The
+        # cases left to ET.tostring, such as other methods and encodings, are
+        # indented in place as ET.indent does.
+        indent(element_or_tree)
     return ET.tostring(element_or_tree, encoding, method)
 
 
+class _Unserializable(Exception):
+    """
+    Raised by _serialize for trees it leaves to the ElementTree serializer.
+    """
+
+
+# Per encoding, caches shared across tostring calls of:
+# - the encoded start and end tag markup of tag names,
+# - the encoded ' name="' prefix of attribute names,
+# - the escaped and encoded form of short text and tail values,
+# - the escaped and encoded form of short attribute values.
+# Documents repeat the same names, indentation whitespace and attribute
+# values over and over, so most lookups hit and skip escaping and encoding.
+_encoded_caches = {
+    "us-ascii": ({}, {}, {}, {}),
+    "utf-8": ({}, {}, {}, {}),
+}
+_MAX_CACHED_ENTRIES = 4096
+_MAX_CACHED_VALUE_LENGTH = 64
+
+
+def _serialize(buffer, element, tail, level, pretty_print, encoding, caches, qualified):
+    """
+    Append the XML serialization of ``element`` followed by ``tail``, encoded
+    with ``encoding``, to the ``buffer`` bytearray. On Python 3.9 and later,
+    this produces the same bytes as ET.tostring, and with ``pretty_print`` the
+    same bytes as ET.indent then ET.tostring, without modifying the tree.
+    Earlier versions of ET.tostring differ, so tostring does not use this
+    serializer there (see _SERIALIZE_LIKE_ET). ``level`` is the depth of
+    ``element`` in the serialized tree and ``caches`` are the
+    ``_encoded_caches`` of ``encoding``.
+
+    This skips the namespace collection pass and the text stream writes of
+    ET.tostring. Namespace prefixes are chosen as ET does while serializing
+    and collected in the per call ``qualified`` tuple, and the caller then
+    declares them on the root with _declare_namespaces. Non-string names and
+    values, such as ET.QName, are not handled and raise _Unserializable.
+    """
+    encoded_tags, encoded_attribute_names, encoded_texts, encoded_values = caches
+    tag = element.tag
+    text = element.text
+    if tag is Comment:
+        buffer += f"<!--{text}-->".encode(encoding, "xmlcharrefreplace")
+    elif tag is ET.ProcessingInstruction:
+        buffer += f"<?{text}?>".encode(encoding, "xmlcharrefreplace")
+    else:
+        markup = encoded_tags.get(tag)
+        if markup is None:
+            markup = _tag_markup(tag, encoding, encoded_tags, qualified)
+        start, end = markup
+        buffer += start
+        for key, value in element.items():
+            prefix = encoded_attribute_names.get(key)
+            if prefix is None:
+                prefix = _attribute_markup(key, encoding, encoded_attribute_names, qualified)
+            buffer += prefix
+            buffer += _encode(value, _escape_attrib, encoding, encoded_values)
+            buffer += b'"'
+        child_count = len(element)
+        if pretty_print and child_count:
+            # Mirror ET.indent: whitespace-only text and tails are replaced by
+            # a newline and the indentation of the next sibling, and the last
+            # child's tail by the indentation of the closing tag.
+            child_indentation = _indentation(level + 1)
+            if not text or not text.strip():
+                text = child_indentation
+        if text or child_count:
+            buffer += b">"
+            if text:
+                buffer += _encode(text, _escape_cdata, encoding, encoded_texts)
+            if pretty_print:
+                last = child_count - 1
+                for index, child in enumerate(element):
+                    child_tail = child.tail
+                    if not child_tail or not child_tail.strip():
+                        if index == last:
+                            child_tail = _indentation(level)
+                        else:
+                            child_tail = child_indentation
+                    _serialize(
+                        buffer, child, child_tail, level + 1, True, encoding, caches, qualified
+                    )
+            else:
+                for child in element:
+                    _serialize(
+                        buffer, child, child.tail, level + 1, False, encoding, caches, qualified
+                    )
+            buffer += end
+        else:
+            buffer += b" />"
+    if tail:
+        buffer += _encode(tail, _escape_cdata, encoding, encoded_texts)
+
+
+def _tag_markup(tag, encoding, encoded_tags, qualified):
+    """
+    Return the encoded (start, end) tag markup of a ``tag`` missing from the
+    ``encoded_tags`` cache, and cache it there or, for a namespaced tag whose
+    prefix is only valid for the current call, in ``qualified``.
+    """
+    if not isinstance(tag, str):
+        raise _Unserializable
+    if tag[:1] == "{":
+        namespaces, qualified_tags, _ = qualified
+        markup = qualified_tags.get(tag)
+        if markup is None:
+            name = _qualify_name(tag, namespaces).encode(encoding, "xmlcharrefreplace")
+            markup = qualified_tags[tag] = (b"<" + name, b"</" + name + b">")
+        return markup
+    if len(encoded_tags) >= _MAX_CACHED_ENTRIES:
+        encoded_tags.clear()
+    name = tag.encode(encoding, "xmlcharrefreplace")
+    markup = encoded_tags[tag] = (b"<" + name, b"</" + name + b">")
+    return markup
+
+
+def _attribute_markup(key, encoding, encoded_attribute_names, qualified):
+    """
+    Return the encoded ' name="' markup of an attribute ``key`` missing from
+    the ``encoded_attribute_names`` cache, cached as in _tag_markup.
+    """
+    if not isinstance(key, str):
+        raise _Unserializable
+    if key[:1] == "{":
+        namespaces, _, qualified_attribute_names = qualified
+        markup = qualified_attribute_names.get(key)
+        if markup is None:
+            name = _qualify_name(key, namespaces).encode(encoding, "xmlcharrefreplace")
+            markup = qualified_attribute_names[key] = b" " + name + b'="'
+        return markup
+    if len(encoded_attribute_names) >= _MAX_CACHED_ENTRIES:
+        encoded_attribute_names.clear()
+    markup = b" " + key.encode(encoding, "xmlcharrefreplace") + b'="'
+    encoded_attribute_names[key] = markup
+    return markup
+
+
+def _qualify_name(name, namespaces):
+    """
+    Return the prefixed form of a ``{uri}local`` ``name``, adding its uri to
+    the ``namespaces`` {uri: prefix} mapping to declare. Prefixes are picked
+    as ET.tostring picks them: registered ones first, else ``ns0``, ``ns1``
+    and so on in document order.
+    """
+    if _namespace_map is None:
+        raise _Unserializable
+    try:
+        uri, local = name[1:].rsplit("}", 1)
+    except ValueError:
+        raise _Unserializable
+    prefix = namespaces.get(uri)
+    if prefix is None:
+        prefix = _namespace_map.get(uri)
+        if prefix is None:
+            prefix = f"ns{len(namespaces)}"
+        if prefix != "xml":
+            namespaces[uri] = prefix
+    if prefix:
+        return f"{prefix}:{local}"
+    return local
+
+
+def _declare_namespaces(buffer, root_tag, encoding, qualified):
+    """
+    Insert the ``xmlns`` declarations of the ``qualified`` namespaces in the
+    start tag of the root element serialized in ``buffer``, where ET.tostring
+    writes them: right after the tag name and sorted by prefix.
+    """
+    namespaces, qualified_tags, _ = qualified
+    declarations = bytearray()
+    for uri, prefix in sorted(namespaces.items(), key=lambda item: item[1]):
+        if prefix:
+            prefix = ":" + prefix
+        declarations += f' xmlns{prefix}="{_escape_attrib(uri)}"'.encode(
+            encoding, "xmlcharrefreplace"
+        )
+    if root_tag[:1] == "{":
+        start = qualified_tags[root_tag][0]
+    else:
+        start = b"<" + root_tag.encode(encoding, "xmlcharrefreplace")
+    buffer[len(start):len(start)] = declarations
+
+
+def _encode(value, escape, encoding, cache):
+    """
+    Return ``value`` escaped with ``escape`` and encoded with ``encoding``,
+    using and filling the ``cache`` for short values.
+    """
+    if type(value) is not str:
+        # Other types, such as ET.QName, may hash and compare equal to a
+        # cached str while serializing differently. Escaping them raises
+        # _Unserializable unless ET would write them as that str.
+        return escape(value).encode(encoding, "xmlcharrefreplace")
+    encoded = cache.get(value)
+    if encoded is None:
+        encoded = escape(value).encode(encoding, "xmlcharrefreplace")
+        if len(value) <= _MAX_CACHED_VALUE_LENGTH:
+            if len(cache) >= _MAX_CACHED_ENTRIES:
+                cache.clear()
+            cache[value] = encoded
+    return encoded
+
+
+def _escape_cdata(text):
+    try:
+        if "&" in text:
+            text = text.replace("&", "&amp;")
+        if "<" in text:
+            text = text.replace("<", "&lt;")
+        if ">" in text:
+            text = text.replace(">", "&gt;")
+        return text
+    except (TypeError, AttributeError):
+        raise _Unserializable
+
+
+def _escape_attrib(text):
+    try:
+        if "&" in text:
+            text = text.replace("&", "&amp;")
+        if "<" in text:
+            text = text.replace("<", "&lt;")
+        if ">" in text:
+            text = text.replace(">", "&gt;")
+        if "\"" in text:
+            text = text.replace("\"", "&quot;")
+        if "\r" in text:
+            text = text.replace("\r", "&#13;")
+        if "\n" in text:
+            text = text.replace("\n", "&#10;")
+        if "\t" in text:
+            text = text.replace("\t", "&#09;")
+        return text
+    except (TypeError, AttributeError):
+        raise _Unserializable
+
+
 class XPath:
     def __init__(self, path):
         self.path = path
+        # Pick the evaluation strategy once rather than on every call.
+        if path == "//comment()":
+            self._select = _find_comments
+        else:
+            self._select = methodcaller("findall", path)
 
     def __call__(self, element: ET.Element):
-        if self.path == "//comment()":
-            tags = []
-            for ele in element.iter():
-                if ele.tag == ET.Comment:
-                    tags.append(ele)
-            return tags
-        else:
-            return element.findall(self.path)
+        return self._select(element)
+
+
+def _find_comments(element):
+    return list(element.iter(ET.Comment))
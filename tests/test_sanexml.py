@@ -7,6 +7,7 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import io
 import unittest
 from sanexml import etree
 
@@ -18,16 +19,83 @@ class TestSaneXMLEtreeMethods(unittest.TestCase):
         element = etree.fromstring(xml_string)
         self.assertEqual(element.tag, 'root')
 
+    def test_fromstring_malformed(self):
+        xml_string = '<root><Child>a<br>b&nbsp;</Child></root>'
+        element = etree.fromstring(xml_string)
+        self.assertEqual(element.tag, 'root')
+        self.assertEqual(element[0].tag, 'Child')
+
+    def test_fromstring_malformed_namespaces(self):
+        xml_string = (
+            '<root xmlns="urn:a" xmlns:b="urn:b">'
+            '<b:child b:attr="1">&nbsp;</b:child></root>'
+        )
+        element = etree.fromstring(xml_string)
+        self.assertEqual(element.tag, '{urn:a}root')
+        self.assertEqual(element[0].tag, '{urn:b}child')
+        self.assertEqual(element[0].get('{urn:b}attr'), '1')
+
+    def test_fromstring_malformed_invalid(self):
+        xml_strings = [
+            '<root><a 1x="2" b<c="3">&nbsp;</a></root>',
+            '<root><script>if (a<b) x</script>&nbsp;</root>',
+            '  <root>&nbsp;</root>  trailing',
+            '<root>\x0b&nbsp;</root>',
+            '<root xmlns:a=""><a:b>&nbsp;</a:b></root>',
+            '<x xmlns:a="urn:u" xmlns:b="urn:u" a:k="1" b:k="2">&nbsp;</x>',
+        ]
+        for xml_string in xml_strings:
+            with self.assertRaises(etree.ET.ParseError):
+                etree.fromstring(xml_string)
+            with self.assertRaises(etree.ET.ParseError):
+                etree.fromstring(xml_string, parser=etree.XMLParser())
+
     def test_tostring(self):
         xml_string = '<root><child>text</child></root>'
         element = etree.fromstring(xml_string)
         result = etree.tostring(element)
         self.assertEqual(result, bytes(xml_string, 'utf-8'))
 
+    def test_tostring_escapes(self):
+        element = etree.Element('root', {'attr': 'a"<&\n'})
+        etree.SubElement(element, 'child').text = 'x < y & \u00e9'
+        result = etree.tostring(element)
+        expected_result = (
+            b'<root attr="a&quot;&lt;&amp;&#10;"><child>x &lt; y &amp; &#233;</child></root>'
+        )
+        self.assertEqual(result, expected_result)
+
+    def test_tostring_namespaces(self):
+        xml_string = '<root xml:lang="en"><a/><x:b xmlns:x="urn:x" x:c="1"/></root>'
+        element = etree.fromstring(xml_string)
+        result = etree.tostring(element)
+        expected_result = b'<root xmlns:ns0="urn:x" xml:lang="en"><a /><ns0:b ns0:c="1" /></root>'
+        self.assertEqual(result, expected_result)
+
+    def test_tostring_qname_values(self):
+        etree.tostring(etree.Element('root', {'attr': '{urn:x}v'}))
+        element = etree.Element('root', {'attr': etree.ET.QName('{urn:x}v')})
+        result = etree.tostring(element)
+        self.assertEqual(result, b'<root xmlns:ns0="urn:x" attr="ns0:v" />')
+        etree.tostring(etree.fromstring('<root>q</root>'))
+        element = etree.Element('root')
+        element.text = etree.ET.QName('q')
+        with self.assertRaises(TypeError):
+            etree.tostring(element)
+
     def test_Element(self):
         element = etree.Element('root')
         self.assertEqual(element.tag, 'root')
 
+    def test_Element_nsmap_after_external_registration(self):
+        namespace_map = etree.ET._namespace_map
+        self.addCleanup(namespace_map.update, dict(namespace_map))
+        self.addCleanup(namespace_map.clear)
+        etree.Element('root', nsmap={'x': 'urn:sanexml:1'})
+        etree.ET.register_namespace('x', 'urn:sanexml:2')
+        element = etree.Element('{urn:sanexml:1}root', nsmap={'x': 'urn:sanexml:1'})
+        self.assertEqual(etree.tostring(element), b'<x:root xmlns:x="urn:sanexml:1" />')
+
     def test_Subelement(self):
         parent = etree.Element('root')
         child = etree.SubElement(parent, 'child')
@@ -41,11 +109,33 @@ class TestSaneXMLEtreeMethods(unittest.TestCase):
         result = etree.tostring(element)
         self.assertEqual(result, expected_result)
 
+    def test_tostring_pretty_print(self):
+        xml_string = '<root><child>text</child></root>'
+        element = etree.fromstring(xml_string)
+        result = etree.tostring(element, pretty_print=True)
+        self.assertEqual(result, b'<root>\n  <child>text</child>\n</root>')
+        self.assertEqual(etree.tostring(element), bytes(xml_string, 'utf-8'))
+
+        xml_string = '<root xmlns="urn:x"><child>text</child></root>'
+        element = etree.fromstring(xml_string)
+        result = etree.tostring(element, pretty_print=True)
+        expected_result = (
+            b'<ns0:root xmlns:ns0="urn:x">\n  <ns0:child>text</ns0:child>\n</ns0:root>'
+        )
+        self.assertEqual(result, expected_result)
+        self.assertIsNone(element.text)
+
     def test_iselement(self):
         element = etree.Element('root')
         self.assertTrue(etree.iselement(element))
         self.assertFalse(etree.iselement('not an element'))
 
+    def test_parse_stream(self):
+        xml_string = b'<root><item>1<sub/></item><skip a="b">2<sub/></skip></root>'
+        root = etree.parse_stream(io.BytesIO(xml_string), keep=lambda e: e.tag != 'skip')
+        result = etree.tostring(root)
+        self.assertEqual(result, b'<root><item>1<sub /></item><skip /></root>')
+
     def test_strip_attributes(self):
         xml_string = '<root attr="value"><child attic="meow">text</child></root>'
         element1 = etree.fromstring(xml_string)
@@ -56,15 +146,33 @@ class TestSaneXMLEtreeMethods(unittest.TestCase):
         self.assertIsNone(element2.get('attr'))
         self.assertIsNone(element2.get('attic'))
 
+    def test_strip_attributes_literal_names(self):
+        element = etree.Element('root', {'x.y': '1', 'xzy': '2', '{http://e.com/ns?v=1}a': '3'})
+        etree.strip_attributes(element, 'x.y', '{http://e.com/ns?v=1}a', '{urn:(}*')
+        self.assertEqual(element.attrib, {'xzy': '2'})
+
     def test_strip_elements(self):
         xml_string = '<root><child><subchild/></child><close>LoremIpsum</close></root>'
         element = etree.fromstring(xml_string)
         etree.strip_elements(element, 'subchild')
         self.assertNotIn('subchild', [e.tag for e in element.iter()])
 
+    def test_strip_elements_names_and_wildcards(self):
+        xml_string = '<root><child><subchild/></child><close>LoremIpsum</close><keep/></root>'
+        element = etree.fromstring(xml_string)
+        etree.strip_elements(element, 'sub*', 'close')
+        self.assertEqual(etree.tostring(element), b'<root><child /><keep /></root>')
+
     def test_strip_tags(self):
         xml_string = '<root><!-- comment --><child>text</child></root>'
         element = etree.fromstring(xml_string)
         etree.strip_tags(element, etree.Comment)
         result = etree.tostring(element)
         self.assertEqual(result, b'<root><child>text</child></root>')
+
+    def test_strip_tags_merges_content(self):
+        xml_string = '<root>a<!--c-->b<x>1<y>2</y>3</x>4</root>'
+        element = etree.fromstring(xml_string, parser=etree.XMLParser())
+        etree.strip_tags(element, etree.Comment, 'x')
+        result = etree.tostring(element)
+        self.assertEqual(result, b'<root>ab1<y>2</y>34</root>')